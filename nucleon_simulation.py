@@ -1,8 +1,9 @@
 import pygame
-import random
 import math
 import numpy as np
 from collections import defaultdict
+from functools import lru_cache
+from numba import njit, prange, cuda, float32, boolean
 
 # Initialize Pygame
 pygame.init()
@@ -26,11 +27,32 @@ FRAGMENT_DISTANCE = 100
 
 # Physics parameters
 STRONG_FORCE_RADIUS = 30
+ELECTROSTATIC_RADIUS = 100
 ELECTROSTATIC_CONSTANT = 40
 STRONG_FORCE_CONSTANT = 10
 MAX_VELOCITY = 2
 SPRING_DAMPENING = 0.3
 
+# Squared cutoffs, for range tests that don't need the distance itself
+STRONG_FORCE_RADIUS_SQ = STRONG_FORCE_RADIUS**2
+ELECTROSTATIC_RADIUS_SQ = ELECTROSTATIC_RADIUS**2
+FRAGMENT_RADIUS_SQ = (STRONG_FORCE_RADIUS * 0.7)**2
+
+# exp(-distance/5) for the strong-force well, sampled every 1/8 unit out to 20
+EXP_TABLE_STEPS = 8
+EXP_TABLE = np.exp(-np.arange(20 * EXP_TABLE_STEPS + 1) / (5 * EXP_TABLE_STEPS)).astype(np.float32)
+
+# Spatial hash: a cell spans the longest interaction range, so every pair
+# that can interact lies in the same or an adjacent cell
+CELL_SIZE = max(STRONG_FORCE_RADIUS, ELECTROSTATIC_RADIUS)
+GRID_WIDTH = math.ceil(WIDTH / CELL_SIZE)
+GRID_HEIGHT = math.ceil(HEIGHT / CELL_SIZE)
+
+# Fragment and bond-drawing searches only reach as far as a bond, so they get a finer grid of their own
+BOND_CELL_SIZE = STRONG_FORCE_RADIUS
+BOND_GRID_WIDTH = math.ceil(WIDTH / BOND_CELL_SIZE)
+BOND_GRID_HEIGHT = math.ceil(HEIGHT / BOND_CELL_SIZE)
+
 # Decay parameters
 BETA_DECAY_PROBABILITY = 0.002
 NEUTRON_RICH_THRESHOLD = 1.5
@@ -40,107 +62,486 @@ PROTON_RICH_THRESHOLD = 1.2
 INITIAL_PROTONS = 12
 INITIAL_NEUTRONS = 16
 
-class Nucleon:
-    def __init__(self, x, y, is_proton):
-        self.is_proton = is_proton  # Fixed typo in variable name
-        self.pos = np.array([float(x), float(y)])
-        self.vel = np.array([random.uniform(-0.1, 0.1), random.uniform(-0.1, 0.1)])
-        self.color = RED if is_proton else BLUE
-        self.fragment_id = 0
-        self.bond_strength = 0
-
-    def update(self, nucleons):
-        self.calculate_neighbors(nucleons)
-        self.apply_forces(nucleons)
-        self.move()
-        return self.check_decay(nucleons)
-
-    def apply_forces(self, nucleons):
-        for other in nucleons:
-            if other is not self:
-                if self.is_proton and other.is_proton:
-                    self.electrostatic_force(other)
-                self.strong_force(other)
-
-    def electrostatic_force(self, other):
-        delta = other.pos - self.pos
-        distance = max(np.linalg.norm(delta), 0.1)
-        if distance < 100:
-            force = (ELECTROSTATIC_CONSTANT / (distance**2 + 1)) * delta/distance
-            self.vel -= force * 0.5
-            other.vel += force * 0.5
-
-    def strong_force(self, other):
-        delta = other.pos - self.pos
-        distance = max(np.linalg.norm(delta), 0.1)
-        
-        if distance < STRONG_FORCE_RADIUS:
-            if distance < 8:
-                force = -STRONG_FORCE_CONSTANT * (8 - distance) * delta/distance
-            elif distance < 20:
-                force = STRONG_FORCE_CONSTANT * math.exp(-distance/5) * delta/distance
-            else:
-                force = np.array([0, 0])
-            
-            self.vel += force * 0.5
-            other.vel -= force * 0.5
-            
-            rel_vel = other.vel - self.vel
-            damping = SPRING_DAMPENING * (1 - distance/STRONG_FORCE_RADIUS) * rel_vel
-            self.vel += damping
-            other.vel -= damping
+# Bound partners recorded per nucleon before the bond list has to widen
+BOND_CAPACITY = 32
+
+# Most conjugate-gradient steps for the damping solve, which stops early once the
+# squared residual has shrunk by DAMPING_TOLERANCE
+DAMPING_ITERATIONS = 32
+DAMPING_TOLERANCE = 1e-6
+
+# The CUDA kernels only pay off once the system is a few hundred nucleons large
+GPU_TILE = 128
+GPU_MIN_NUCLEONS = 256
+USE_GPU = cuda.is_available() and INITIAL_PROTONS + INITIAL_NEUTRONS >= GPU_MIN_NUCLEONS
+
+def build_grid(pos, cell_size=CELL_SIZE):
+    """Bucket nucleons by cell as CSR arrays: cell c holds cell_indices[cell_start[c]:cell_start[c+1]]"""
+    grid_width = math.ceil(WIDTH / cell_size)
+    grid_height = math.ceil(HEIGHT / cell_size)
+    cx = np.minimum((pos[:, 0] // cell_size).astype(np.int32), grid_width - 1)
+    cy = np.minimum((pos[:, 1] // cell_size).astype(np.int32), grid_height - 1)
+    cell = cy * grid_width + cx
+    cell_indices = np.argsort(cell, kind='stable').astype(np.int32)
+    counts = np.bincount(cell, minlength=grid_width * grid_height)
+    cell_start = np.zeros(len(counts) + 1, dtype=np.int32)
+    np.cumsum(counts, out=cell_start[1:])
+    return cell_start, cell_indices
+
+def interacts(dist2, both_protons):
+    """Whether a pair at squared distance dist2 is inside any interaction range"""
+    return dist2 < STRONG_FORCE_RADIUS_SQ or (both_protons and dist2 < ELECTROSTATIC_RADIUS_SQ)
+
+def pair_force(distance, both_protons):
+    """Force on a nucleon per unit of separation towards its partner (negative repels)"""
+    distance = max(distance, 0.1)
+
+    # Electrostatic repulsion between protons
+    magnitude = 0.0
+    if both_protons and distance < ELECTROSTATIC_RADIUS:
+        magnitude -= ELECTROSTATIC_CONSTANT / (distance*distance + 1)
+
+    # Strong force: hard core below 8, attractive well out to 20
+    if distance < 8:
+        magnitude -= STRONG_FORCE_CONSTANT * (8 - distance)
+    elif distance < 20:
+        magnitude += STRONG_FORCE_CONSTANT * EXP_TABLE[int(distance * EXP_TABLE_STEPS + 0.5)]
+
+    return magnitude / distance
+
+def damping_weight(distance):
+    """How strongly a bound pair's relative velocity is damped by the implicit solve
+
+    The pairwise loop this replaced visited each pair twice a frame, scaling its relative
+    velocity by 1 - 2w each time; with this weight an isolated pair ends up at the same (1 - 2w)**2.
+    """
+    w = SPRING_DAMPENING * (1 - max(distance, 0.1)/STRONG_FORCE_RADIUS)
+    return (1 / (1 - 2*w)**2 - 1) / 2
+
+# The pair maths above, compiled once for step() and once for the CUDA kernels
+interacts_cpu = njit(fastmath=True, cache=True)(interacts)
+pair_force_cpu = njit(fastmath=True, cache=True)(pair_force)
+damping_weight_cpu = njit(fastmath=True, cache=True)(damping_weight)
+interacts_gpu = cuda.jit(device=True)(interacts)
+pair_force_gpu = cuda.jit(device=True)(pair_force)
+damping_weight_gpu = cuda.jit(device=True)(damping_weight)
+
+@njit('void(float32[:, ::1], float32[:, ::1], boolean[::1], int32[::1], int32[::1], float32[:, ::1], '
+      'int32[:, ::1], float32[:, ::1], float32[:, ::1], float32[:, ::1], float32[:, ::1], '
+      'float32[:, ::1], int32[::1], float32[::1], int64)',
+      parallel=True, fastmath=True, cache=True)
+def step(pos, vel, is_proton, cell_start, cell_indices, force, bond_j, bond_weight,
+         residual, direction, product, out_dv, out_neighbors, out_bond, n):
+    """Velocity change and bond stats for every nucleon: a force pass, then a damping solve
+
+    The force pass records each nucleon's bound partners in row i of bond_j/bond_weight
+    (up to their width; out_neighbors holds the full count so the caller can widen them)
+    and the damping solve reads that list back instead of searching the grid again.
+    """
+    # Each nucleon gathers from its neighbours and only writes its own row,
+    # so the threads never race
+    capacity = bond_j.shape[1]
+    for i in prange(n):
+        xi = pos[i, 0]
+        yi = pos[i, 1]
+        fxi = 0.0
+        fyi = 0.0
+        neighbors = 0
+        bond = 0.0
+
+        # Only the 3x3 block of cells around nucleon i can hold interacting pairs
+        cx = min(int(xi // CELL_SIZE), GRID_WIDTH - 1)
+        cy = min(int(yi // CELL_SIZE), GRID_HEIGHT - 1)
+        for gy in range(max(cy - 1, 0), min(cy + 2, GRID_HEIGHT)):
+            for gx in range(max(cx - 1, 0), min(cx + 2, GRID_WIDTH)):
+                cell = gy * GRID_WIDTH + gx
+                for k in range(cell_start[cell], cell_start[cell + 1]):
+                    j = cell_indices[k]
+                    if j == i:
+                        continue
+                    dx = pos[j, 0] - xi
+                    dy = pos[j, 1] - yi
+                    dist2 = dx*dx + dy*dy
+                    both_protons = is_proton[i] and is_proton[j]
+                    if not interacts_cpu(dist2, both_protons):
+                        continue
+                    distance = math.sqrt(dist2)
+
+                    if distance < STRONG_FORCE_RADIUS:
+                        if neighbors < capacity:
+                            bond_j[i, neighbors] = j
+                            bond_weight[i, neighbors] = damping_weight_cpu(distance)
+                        neighbors += 1
+                        if distance < 15:
+                            bond += 15 - distance
+
+                    scale = pair_force_cpu(distance, both_protons)
+                    fxi += scale * dx
+                    fyi += scale * dy
+
+        force[i, 0] = fxi
+        force[i, 1] = fyi
+        out_neighbors[i] = neighbors
+        out_bond[i] = bond
+
+    # Damp the post-force velocities implicitly: solve (I + L) v = vel + force, L being
+    # the graph Laplacian of the bond weights, by conjugate gradients. Each pass needs
+    # the previous one complete, so they run one after another. out_dv holds v until the end
+    rr = 0.0
+    for i in prange(n):
+        kicked_x = vel[i, 0] + force[i, 0]
+        kicked_y = vel[i, 1] + force[i, 1]
+        rx = 0.0
+        ry = 0.0
+        for k in range(min(out_neighbors[i], capacity)):
+            j = bond_j[i, k]
+            rx += bond_weight[i, k] * (vel[j, 0] + force[j, 0] - kicked_x)
+            ry += bond_weight[i, k] * (vel[j, 1] + force[j, 1] - kicked_y)
+        out_dv[i, 0] = kicked_x
+        out_dv[i, 1] = kicked_y
+        residual[i, 0] = rx
+        residual[i, 1] = ry
+        direction[i, 0] = rx
+        direction[i, 1] = ry
+        rr += rx*rx + ry*ry
+
+    rr_stop = DAMPING_TOLERANCE * rr
+    for _ in range(DAMPING_ITERATIONS):
+        if rr <= rr_stop:
+            break
+
+        curvature = 0.0
+        for i in prange(n):
+            px = direction[i, 0]
+            py = direction[i, 1]
+            ax = px
+            ay = py
+            for k in range(min(out_neighbors[i], capacity)):
+                j = bond_j[i, k]
+                ax += bond_weight[i, k] * (px - direction[j, 0])
+                ay += bond_weight[i, k] * (py - direction[j, 1])
+            product[i, 0] = ax
+            product[i, 1] = ay
+            curvature += px*ax + py*ay
+
+        alpha = rr / curvature
+        rr_next = 0.0
+        for i in prange(n):
+            out_dv[i, 0] += alpha * direction[i, 0]
+            out_dv[i, 1] += alpha * direction[i, 1]
+            residual[i, 0] -= alpha * product[i, 0]
+            residual[i, 1] -= alpha * product[i, 1]
+            rr_next += residual[i, 0]*residual[i, 0] + residual[i, 1]*residual[i, 1]
+
+        beta = rr_next / rr
+        for i in prange(n):
+            direction[i, 0] = residual[i, 0] + beta * direction[i, 0]
+            direction[i, 1] = residual[i, 1] + beta * direction[i, 1]
+        rr = rr_next
+
+    for i in prange(n):
+        out_dv[i, 0] -= vel[i, 0]
+        out_dv[i, 1] -= vel[i, 1]
+
+@cuda.jit
+def step_gpu_forces(pos, is_proton, out_force, bond_j, bond_weight, out_neighbors, out_bond,
+                    most_bonds, dots, n):
+    """Force pass of step(), one thread per nucleon, with partners streamed through shared memory"""
+    tile_pos = cuda.shared.array((GPU_TILE, 2), float32)
+    tile_proton = cuda.shared.array(GPU_TILE, boolean)
+
+    i = cuda.grid(1)
+    t = cuda.threadIdx.x
+    # The damping kernels launched after this one accumulate into dots
+    if i < dots.shape[0]:
+        dots[i] = 0
+    # Threads past the end still help load tiles, so they can't return early
+    active = i < n
+    xi = 0.0
+    yi = 0.0
+    proton_i = False
+    if active:
+        xi = pos[i, 0]
+        yi = pos[i, 1]
+        proton_i = is_proton[i]
+    fxi = 0.0
+    fyi = 0.0
+    neighbors = 0
+    bond = 0.0
+    capacity = bond_j.shape[1]
+
+    for tile_start in range(0, n, GPU_TILE):
+        j = tile_start + t
+        if j < n:
+            tile_pos[t, 0] = pos[j, 0]
+            tile_pos[t, 1] = pos[j, 1]
+            tile_proton[t] = is_proton[j]
+        cuda.syncthreads()
+
+        for k in range(min(GPU_TILE, n - tile_start)):
+            if not active or tile_start + k == i:
+                continue
+            dx = tile_pos[k, 0] - xi
+            dy = tile_pos[k, 1] - yi
+            dist2 = dx*dx + dy*dy
+            both_protons = proton_i and tile_proton[k]
+            if not interacts_gpu(dist2, both_protons):
+                continue
+            distance = math.sqrt(dist2)
+
+            if distance < STRONG_FORCE_RADIUS:
+                if neighbors < capacity:
+                    bond_j[i, neighbors] = tile_start + k
+                    bond_weight[i, neighbors] = damping_weight_gpu(distance)
+                neighbors += 1
+                if distance < 15:
+                    bond += 15 - distance
+
+            scale = pair_force_gpu(distance, both_protons)
+            fxi += scale * dx
+            fyi += scale * dy
+        cuda.syncthreads()
+
+    if active:
+        out_force[i, 0] = fxi
+        out_force[i, 1] = fyi
+        out_neighbors[i] = neighbors
+        out_bond[i] = bond
+        cuda.atomic.max(most_bonds, 0, neighbors)
+
+@cuda.jit
+def step_gpu_damping_start(vel, force, bond_j, bond_weight, neighbors, new_vel, residual, direction, dots, n):
+    """Starting point of the damping solve in step(); runs after step_gpu_forces() has finished
+
+    dots holds the solve's reductions: dots[2*it] is the squared residual entering
+    iteration it and dots[2*it + 1] its curvature.
+    """
+    i = cuda.grid(1)
+    if i >= n:
+        return
+    kicked_x = vel[i, 0] + force[i, 0]
+    kicked_y = vel[i, 1] + force[i, 1]
+    rx = 0.0
+    ry = 0.0
+    for k in range(min(neighbors[i], bond_j.shape[1])):
+        j = bond_j[i, k]
+        rx += bond_weight[i, k] * (vel[j, 0] + force[j, 0] - kicked_x)
+        ry += bond_weight[i, k] * (vel[j, 1] + force[j, 1] - kicked_y)
+    new_vel[i, 0] = kicked_x
+    new_vel[i, 1] = kicked_y
+    residual[i, 0] = rx
+    residual[i, 1] = ry
+    direction[i, 0] = rx
+    direction[i, 1] = ry
+    cuda.atomic.add(dots, 0, rx*rx + ry*ry)
+
+# Each conjugate-gradient iteration needs a finished reduction between its steps, so it is
+# three launches; once the residual has shrunk by DAMPING_TOLERANCE the rest return at once
+
+@cuda.jit
+def step_gpu_damping_product(bond_j, bond_weight, neighbors, direction, product, dots, it, n):
+    i = cuda.grid(1)
+    if i >= n or dots[2*it] <= DAMPING_TOLERANCE * dots[0]:
+        return
+    px = direction[i, 0]
+    py = direction[i, 1]
+    ax = px
+    ay = py
+    for k in range(min(neighbors[i], bond_j.shape[1])):
+        j = bond_j[i, k]
+        ax += bond_weight[i, k] * (px - direction[j, 0])
+        ay += bond_weight[i, k] * (py - direction[j, 1])
+    product[i, 0] = ax
+    product[i, 1] = ay
+    cuda.atomic.add(dots, 2*it + 1, px*ax + py*ay)
+
+@cuda.jit
+def step_gpu_damping_update(new_vel, residual, direction, product, dots, it, n):
+    i = cuda.grid(1)
+    if i >= n or dots[2*it] <= DAMPING_TOLERANCE * dots[0]:
+        return
+    alpha = dots[2*it] / dots[2*it + 1]
+    new_vel[i, 0] += alpha * direction[i, 0]
+    new_vel[i, 1] += alpha * direction[i, 1]
+    rx = residual[i, 0] - alpha * product[i, 0]
+    ry = residual[i, 1] - alpha * product[i, 1]
+    residual[i, 0] = rx
+    residual[i, 1] = ry
+    cuda.atomic.add(dots, 2*it + 2, rx*rx + ry*ry)
+
+@cuda.jit
+def step_gpu_damping_direction(residual, direction, dots, it, n):
+    i = cuda.grid(1)
+    if i >= n or dots[2*it + 2] <= DAMPING_TOLERANCE * dots[0]:
+        return
+    beta = dots[2*it + 2] / dots[2*it]
+    direction[i, 0] = residual[i, 0] + beta * direction[i, 0]
+    direction[i, 1] = residual[i, 1] + beta * direction[i, 1]
+
+@cuda.jit
+def step_gpu_integrate(pos, vel, new_vel, most_bonds, n):
+    """Take the damped velocities and move, as apply_forces() and move() do on the CPU"""
+    i = cuda.grid(1)
+    if i == 0:
+        # Every forces launch has been checked by now; clear the maximum for the next frame
+        most_bonds[0] = 0
+    if i >= n:
+        return
+    vel[i, 0] = new_vel[i, 0]
+    vel[i, 1] = new_vel[i, 1]
+    pos[i, 0] = (pos[i, 0] + new_vel[i, 0]) % WIDTH
+    pos[i, 1] = (pos[i, 1] + new_vel[i, 1]) % HEIGHT
+
+class NucleonSystem:
+    """All nucleons stored as parallel arrays (structure of arrays)"""
+    __slots__ = ('n_protons', 'pos', 'vel', 'is_proton', 'fragment_id',
+                 'neighbors', 'bond_strength', 'dv', 'force', 'solver', 'bond_j', 'bond_weight',
+                 'device_state', 'device_scratch', 'device_bonds')
+
+    def __init__(self, n_protons, n_neutrons):
+        n = n_protons + n_neutrons
+        self.n_protons = n_protons
+        self.pos = np.empty((n, 2), dtype=np.float32)
+        self.vel = np.empty((n, 2), dtype=np.float32)
+        self.is_proton = np.empty(n, dtype=bool)
+        self.fragment_id = np.zeros(n, dtype=np.int32)
+        self.neighbors = np.zeros(n, dtype=np.int32)
+        self.bond_strength = np.zeros(n, dtype=np.float32)
+        self.dv = np.zeros((n, 2), dtype=np.float32)
+        # Scratch for step(); the bond list widens itself if a nucleon outgrows it
+        self.force = np.zeros((n, 2), dtype=np.float32)
+        self.solver = np.zeros((3, n, 2), dtype=np.float32)
+        if USE_GPU:
+            # The state lives on the device; only positions come back each frame
+            self.device_state = (cuda.device_array_like(self.pos),
+                                 cuda.device_array_like(self.vel),
+                                 cuda.device_array_like(self.is_proton))
+            self.device_scratch = (cuda.device_array_like(self.force),
+                                   cuda.device_array_like(self.dv),
+                                   cuda.device_array_like(self.neighbors),
+                                   cuda.device_array_like(self.bond_strength),
+                                   cuda.device_array_like(self.solver),
+                                   cuda.to_device(np.zeros(1, dtype=np.int32)),
+                                   cuda.device_array(2*DAMPING_ITERATIONS + 1, dtype=np.float32))
+        self.resize_bonds(BOND_CAPACITY)
+        self.reset()
+
+    def reset(self):
+        # Refill the existing arrays in place
+        n = len(self)
+        angle = np.random.uniform(0, 2*math.pi, n)
+        r = np.random.uniform(0, 20, n)
+        self.pos[:, 0] = WIDTH//2 + r * np.cos(angle)
+        self.pos[:, 1] = HEIGHT//2 + r * np.sin(angle)
+        self.vel[:] = np.random.uniform(-0.1, 0.1, (n, 2))
+        self.is_proton[:] = np.arange(n) < self.n_protons
+        self.fragment_id[:] = 0
+        if USE_GPU:
+            for device, host in zip(self.device_state, (self.pos, self.vel, self.is_proton)):
+                device.copy_to_device(host)
+
+    def __len__(self):
+        return len(self.pos)
+
+    def resize_bonds(self, capacity):
+        if USE_GPU:
+            self.device_bonds = (cuda.device_array((len(self), capacity), dtype=np.int32),
+                                 cuda.device_array((len(self), capacity), dtype=np.float32))
+        else:
+            self.bond_j = np.zeros((len(self), capacity), dtype=np.int32)
+            self.bond_weight = np.zeros((len(self), capacity), dtype=np.float32)
+
+    def update(self):
+        if USE_GPU:
+            self.step_gpu()
+        else:
+            self.apply_forces()
+            self.move()
+        return self.check_decay()
+
+    def apply_forces(self):
+        cell_start, cell_indices = build_grid(self.pos)
+        while True:
+            step(self.pos, self.vel, self.is_proton, cell_start, cell_indices, self.force,
+                 self.bond_j, self.bond_weight, *self.solver, self.dv, self.neighbors,
+                 self.bond_strength, len(self))
+            most_bonds = int(self.neighbors.max(initial=0))
+            if most_bonds <= self.bond_j.shape[1]:
+                break
+            self.resize_bonds(2 * most_bonds)
+        self.vel += self.dv
+
+    def step_gpu(self):
+        """apply_forces() and move() on the device, copying back only the new positions"""
+        n = len(self)
+        d_pos, d_vel, d_is_proton = self.device_state
+        d_force, d_new_vel, d_neighbors, d_bond, d_solver, d_most_bonds, d_dots = self.device_scratch
+        d_residual, d_direction, d_product = d_solver[0], d_solver[1], d_solver[2]
+        blocks = (n + GPU_TILE - 1) // GPU_TILE
+        while True:
+            d_bond_j, d_bond_weight = self.device_bonds
+            step_gpu_forces[blocks, GPU_TILE](d_pos, d_is_proton, d_force, d_bond_j, d_bond_weight,
+                                              d_neighbors, d_bond, d_most_bonds, d_dots, n)
+            most_bonds = int(d_most_bonds.copy_to_host()[0])
+            if most_bonds <= d_bond_j.shape[1]:
+                break
+            self.resize_bonds(2 * most_bonds)
+        # Damping needs every force, and integration every damped velocity, so each is its own launch
+        step_gpu_damping_start[blocks, GPU_TILE](d_vel, d_force, d_bond_j, d_bond_weight, d_neighbors,
+                                                 d_new_vel, d_residual, d_direction, d_dots, n)
+        for it in range(DAMPING_ITERATIONS):
+            step_gpu_damping_product[blocks, GPU_TILE](d_bond_j, d_bond_weight, d_neighbors,
+                                                       d_direction, d_product, d_dots, it, n)
+            step_gpu_damping_update[blocks, GPU_TILE](d_new_vel, d_residual, d_direction, d_product,
+                                                      d_dots, it, n)
+            step_gpu_damping_direction[blocks, GPU_TILE](d_residual, d_direction, d_dots, it, n)
+        step_gpu_integrate[blocks, GPU_TILE](d_pos, d_vel, d_new_vel, d_most_bonds, n)
+        d_pos.copy_to_host(self.pos)
 
     def move(self):
         self.pos += self.vel
         # Wrap around edges
-        self.pos[0] %= WIDTH
-        self.pos[1] %= HEIGHT
-
-    def calculate_neighbors(self, nucleons):
-        self.neighbors = 0
-        self.bond_strength = 0
-        for other in nucleons:
-            if other is not self:
-                distance = np.linalg.norm(other.pos - self.pos)
-                if distance < STRONG_FORCE_RADIUS:
-                    self.neighbors += 1
-                    if distance < 15:
-                        self.bond_strength += (15 - distance)
-
-    def check_decay(self, nucleons):
-        if random.random() > BETA_DECAY_PROBABILITY:
-            return None
-        
-        fragment_nucleons = [n for n in nucleons if n.fragment_id == self.fragment_id]
-        protons = sum(1 for n in fragment_nucleons if n.is_proton)
-        neutrons = len(fragment_nucleons) - protons
-        
-        if neutrons == 0 and protons == 0:
-            return None
-        
-        # Beta-minus decay
-        if (not self.is_proton and neutrons > 0 and 
-            (protons == 0 or neutrons/protons > NEUTRON_RICH_THRESHOLD) and 
-            self.bond_strength < 20):
-            
-            self.is_proton = True  # Fixed variable name
-            self.color = RED
-            print(f"β⁻ decay: n→p (n/p={neutrons}/{protons})")
-            return {"pos": self.pos.copy(), "type": "electron"}
-        
-        # Beta-plus decay
-        elif (self.is_proton and protons > 0 and 
-              (neutrons == 0 or protons/neutrons > PROTON_RICH_THRESHOLD) and 
-              self.bond_strength < 15):
-            
-            self.is_proton = False
-            self.color = BLUE
-            print(f"β⁺ decay: p→n (p/n={protons}/{neutrons})")
-            return {"pos": self.pos.copy(), "type": "positron"}
-        
-        return None
+        self.pos[:, 0] %= WIDTH
+        self.pos[:, 1] %= HEIGHT
+
+    def check_decay(self):
+        decays = []
+        candidates = np.flatnonzero(np.random.random(len(self)) < BETA_DECAY_PROBABILITY)
+        if USE_GPU and len(candidates):
+            self.device_scratch[3].copy_to_host(self.bond_strength)
+        for i in candidates:
+            fragment = self.fragment_id == self.fragment_id[i]
+            protons = int(np.count_nonzero(self.is_proton & fragment))
+            neutrons = int(np.count_nonzero(fragment)) - protons
+
+            if neutrons == 0 and protons == 0:
+                continue
+
+            # Beta-minus decay
+            if (not self.is_proton[i] and neutrons > 0 and
+                (protons == 0 or neutrons/protons > NEUTRON_RICH_THRESHOLD) and
+                self.bond_strength[i] < 20):
+
+                self.is_proton[i] = True
+                print(f"β⁻ decay: n→p (n/p={neutrons}/{protons})")
+                decays.append({"pos": self.pos[i].copy(), "type": "electron"})
+
+            # Beta-plus decay
+            elif (self.is_proton[i] and protons > 0 and
+                  (neutrons == 0 or protons/neutrons > PROTON_RICH_THRESHOLD) and
+                  self.bond_strength[i] < 15):
+
+                self.is_proton[i] = False
+                print(f"β⁺ decay: p→n (p/n={protons}/{neutrons})")
+                decays.append({"pos": self.pos[i].copy(), "type": "positron"})
+
+        if USE_GPU and decays:
+            self.device_state[2].copy_to_device(self.is_proton)
+        return decays
 
 class DecayEffect:
+    __slots__ = ('pos', 'lifetime', 'radius')
+
     def __init__(self, pos):
         self.pos = pos
         self.lifetime = 1
@@ -154,54 +555,123 @@ class DecayEffect:
                 pygame.draw.circle(screen, color, self.pos.astype(int), r)
             self.lifetime -= 1
 
-def detect_fragments(nucleons):
-    """Identify separate clusters using connected components"""
-    if not nucleons:
-        return []
-    
-    n = len(nucleons)
-    adj = np.zeros((n, n), dtype=bool)
-    
+@njit(cache=True)
+def find(parent, x):
+    while parent[x] != x:
+        parent[x] = parent[parent[x]]
+        x = parent[x]
+    return x
+
+@njit(cache=True)
+def union(parent, a, b):
+    # Keep the lower index as root so fragments stay ordered by their first nucleon
+    root_a = find(parent, a)
+    root_b = find(parent, b)
+    if root_a < root_b:
+        parent[root_b] = root_a
+    elif root_b < root_a:
+        parent[root_a] = root_b
+
+@njit(cache=True)
+def fragment_roots(pos, cell_start, cell_indices, n):
+    """Union-find over nearby pairs, on the bond-sized grid; returns the root nucleon of each fragment"""
+    parent = np.arange(n)
     for i in range(n):
-        for j in range(i+1, n):
-            distance = np.linalg.norm(nucleons[i].pos - nucleons[j].pos)
-            if distance < STRONG_FORCE_RADIUS * 0.7:
-                adj[i][j] = adj[j][i] = True
-                
-    visited = [False] * n
-    components = []
-    
+        cx = min(int(pos[i, 0] // BOND_CELL_SIZE), BOND_GRID_WIDTH - 1)
+        cy = min(int(pos[i, 1] // BOND_CELL_SIZE), BOND_GRID_HEIGHT - 1)
+        for gy in range(max(cy - 1, 0), min(cy + 2, BOND_GRID_HEIGHT)):
+            for gx in range(max(cx - 1, 0), min(cx + 2, BOND_GRID_WIDTH)):
+                cell = gy * BOND_GRID_WIDTH + gx
+                for k in range(cell_start[cell], cell_start[cell + 1]):
+                    j = cell_indices[k]
+                    if j <= i:
+                        continue
+                    dx = pos[j, 0] - pos[i, 0]
+                    dy = pos[j, 1] - pos[i, 1]
+                    if dx*dx + dy*dy < FRAGMENT_RADIUS_SQ:
+                        union(parent, i, j)
     for i in range(n):
-        if not visited[i]:
-            stack = [i]
-            visited[i] = True
-            component = [i]
-            
-            while stack:
-                node = stack.pop()
-                for neighbor in range(n):
-                    if adj[node][neighbor] and not visited[neighbor]:
-                        visited[neighbor] = True
-                        stack.append(neighbor)
-                        component.append(neighbor)
-            
-            components.append(component)
-    
-    return components
+        parent[i] = find(parent, i)
+    return parent
+
+@njit(cache=True)
+def bond_pairs(pos, cell_start, cell_indices, n):
+    """Every pair closer than STRONG_FORCE_RADIUS, once each, found on the bond-sized grid"""
+    pairs = np.empty((4 * n, 2), dtype=np.int32)
+    count = 0
+    for i in range(n):
+        cx = min(int(pos[i, 0] // BOND_CELL_SIZE), BOND_GRID_WIDTH - 1)
+        cy = min(int(pos[i, 1] // BOND_CELL_SIZE), BOND_GRID_HEIGHT - 1)
+        for gy in range(max(cy - 1, 0), min(cy + 2, BOND_GRID_HEIGHT)):
+            for gx in range(max(cx - 1, 0), min(cx + 2, BOND_GRID_WIDTH)):
+                cell = gy * BOND_GRID_WIDTH + gx
+                for k in range(cell_start[cell], cell_start[cell + 1]):
+                    j = cell_indices[k]
+                    if j <= i:
+                        continue
+                    dx = pos[j, 0] - pos[i, 0]
+                    dy = pos[j, 1] - pos[i, 1]
+                    if dx*dx + dy*dy < STRONG_FORCE_RADIUS_SQ:
+                        if count == len(pairs):
+                            pairs = np.concatenate((pairs, np.empty_like(pairs)))
+                        pairs[count, 0] = i
+                        pairs[count, 1] = j
+                        count += 1
+    return pairs[:count]
+
+@njit(cache=True)
+def rasterise_lines(pixels, colors, starts, ends):
+    """Stamp one-pixel lines into a (width, height, 3) pixel array, one sample per step along the longer axis"""
+    width, height = pixels.shape[0], pixels.shape[1]
+    for line in range(len(starts)):
+        x0 = starts[line, 0]
+        y0 = starts[line, 1]
+        dx = ends[line, 0] - x0
+        dy = ends[line, 1] - y0
+        steps = max(abs(dx), abs(dy), 1)
+        for k in range(steps + 1):
+            x = x0 + int(round(k * dx / steps))
+            y = y0 + int(round(k * dy / steps))
+            if 0 <= x < width and 0 <= y < height:
+                pixels[x, y, 0] = colors[line, 0]
+                pixels[x, y, 1] = colors[line, 1]
+                pixels[x, y, 2] = colors[line, 2]
+
+def draw_lines(surface, colors, starts, ends):
+    """One-pixel lines between integer points, rasterised together instead of one draw call each"""
+    pixels = pygame.surfarray.pixels3d(surface)
+    rasterise_lines(pixels, colors, starts, ends)
+    # Release the surface lock before anything else draws
+    del pixels
+
+def detect_fragments(pos):
+    """Label each nucleon with its cluster, numbering connected components from 0"""
+    n = len(pos)
+    if n == 0:
+        return np.zeros(0, dtype=np.int32)
+
+    roots = fragment_roots(pos, *build_grid(pos, BOND_CELL_SIZE), n)
+    _, labels = np.unique(roots, return_inverse=True)
+    return labels
 
 # Initialize simulation
-nucleons = []
-for i in range(INITIAL_PROTONS + INITIAL_NEUTRONS):
-    angle = random.uniform(0, 2*math.pi)
-    r = random.uniform(0, 20)
-    x = WIDTH//2 + r * math.cos(angle)
-    y = HEIGHT//2 + r * math.sin(angle)
-    is_proton = (i < INITIAL_PROTONS)
-    nucleons.append(Nucleon(x, y, is_proton))
+nucleons = NucleonSystem(INITIAL_PROTONS, INITIAL_NEUTRONS)
+
+# Compile the fragment and bond-drawing kernels before the first frame (step() is typed, so it compiles on import)
+detect_fragments(nucleons.pos)
+bond_pairs(nucleons.pos, *build_grid(nucleons.pos, BOND_CELL_SIZE), len(nucleons))
+draw_lines(screen, np.zeros((0, 3), dtype=np.int64), np.zeros((0, 2), dtype=np.int64),
+           np.zeros((0, 2), dtype=np.int64))
 
 decay_effects = []
 clock = pygame.time.Clock()
 font = pygame.font.SysFont('Arial', 16)
+
+# HUD lines only change when a decay happens, so reuse their surfaces
+@lru_cache(maxsize=64)
+def render_text(text):
+    return font.render(text, True, WHITE)
+
 show_fragments = False
 
 running = True
@@ -213,71 +683,57 @@ while running:
             if event.key == pygame.K_f:
                 show_fragments = not show_fragments
             elif event.key == pygame.K_r:
-                nucleons = []
-                for i in range(INITIAL_PROTONS + INITIAL_NEUTRONS):
-                    angle = random.uniform(0, 2*math.pi)
-                    r = random.uniform(0, 20)
-                    x = WIDTH//2 + r * math.cos(angle)
-                    y = HEIGHT//2 + r * math.sin(angle)
-                    is_proton = (i < INITIAL_PROTONS)
-                    nucleons.append(Nucleon(x, y, is_proton))
+                nucleons.reset()
                 decay_effects = []
 
     screen.fill(BLACK)
     
     # Update fragments
-    fragments = detect_fragments(nucleons)
-    for frag_id, fragment in enumerate(fragments):
-        for n_idx in fragment:
-            nucleons[n_idx].fragment_id = frag_id
+    nucleons.fragment_id[:] = detect_fragments(nucleons.pos)
+    fragment_count = int(nucleons.fragment_id.max(initial=-1)) + 1
     
     # Update nucleons and check for decays
-    for nucleon in nucleons:
-        decay_result = nucleon.update(nucleons)
-        if decay_result:
-            decay_effects.append(DecayEffect(decay_result["pos"]))
+    for decay_result in nucleons.update():
+        decay_effects.append(DecayEffect(decay_result["pos"]))
     
     # Draw bonds
-    for i, n1 in enumerate(nucleons):
-        for n2 in nucleons[i+1:]:
-            distance = np.linalg.norm(n1.pos - n2.pos)
-            if distance < STRONG_FORCE_RADIUS:
-                if show_fragments:
-                    if n1.fragment_id == n2.fragment_id:
-                        color = (100, 100, 255) if n1.fragment_id == 0 else (255, 100, 100)
-                    else:
-                        color = (200, 200, 200)
-                else:
-                    alpha = min(255, int(255 * (1 - distance/STRONG_FORCE_RADIUS)))
-                    color = (100, 100, 100, alpha)
-                pygame.draw.line(screen, color, n1.pos.astype(int), n2.pos.astype(int), 1)
+    pos = nucleons.pos
+    fragment_id = nucleons.fragment_id
+    pairs_i, pairs_j = bond_pairs(pos, *build_grid(pos, BOND_CELL_SIZE), len(nucleons)).T
+    if show_fragments:
+        same = (fragment_id[pairs_i] == fragment_id[pairs_j])[:, None]
+        first = (fragment_id[pairs_i] == 0)[:, None]
+        colors = np.where(same, np.where(first, (100, 100, 255), (255, 100, 100)), (200, 200, 200))
+    else:
+        # The display surface has no alpha channel, so distance-faded bonds were always flat grey
+        colors = np.full((len(pairs_i), 3), 100)
+    draw_lines(screen, colors, pos[pairs_i].astype(int), pos[pairs_j].astype(int))
     
     # Draw decay effects
-    for effect in decay_effects[:]:
+    for effect in decay_effects:
         effect.draw(screen)
-        if effect.lifetime <= 0:
-            decay_effects.remove(effect)
+    decay_effects = [effect for effect in decay_effects if effect.lifetime > 0]
     
     # Draw nucleons
-    for nucleon in nucleons:
+    for i in range(len(nucleons)):
         if show_fragments:
-            frag_color = (100, 100, 255) if nucleon.fragment_id == 0 else (255, 100, 100)
-            pygame.draw.circle(screen, frag_color, nucleon.pos.astype(int), NUCLEON_RADIUS + 1)
-        pygame.draw.circle(screen, nucleon.color, nucleon.pos.astype(int), NUCLEON_RADIUS)
-        if nucleon.is_proton:
-            pygame.draw.circle(screen, WHITE, nucleon.pos.astype(int), NUCLEON_RADIUS//2)
+            frag_color = (100, 100, 255) if fragment_id[i] == 0 else (255, 100, 100)
+            pygame.draw.circle(screen, frag_color, pos[i].astype(int), NUCLEON_RADIUS + 1)
+        color = RED if nucleons.is_proton[i] else BLUE
+        pygame.draw.circle(screen, color, pos[i].astype(int), NUCLEON_RADIUS)
+        if nucleons.is_proton[i]:
+            pygame.draw.circle(screen, WHITE, pos[i].astype(int), NUCLEON_RADIUS//2)
     
     # Display info
-    protons = sum(1 for n in nucleons if n.is_proton)
+    protons = int(np.count_nonzero(nucleons.is_proton))
     neutrons = len(nucleons) - protons
     info_text = [
         f"Protons: {protons}  Neutrons: {neutrons}  n/p: {neutrons/max(1,protons):.2f}",
-        f"Fragments: {len(fragments)}",
+        f"Fragments: {fragment_count}",
         "F: Toggle fragments  R: Reset"
     ]
     for i, text in enumerate(info_text):
-        text_surface = font.render(text, True, WHITE)
-        screen.blit(text_surface, (10, 10 + i*20))
+        screen.blit(render_text(text), (10, 10 + i*20))
     
     pygame.display.flip()
     clock.tick(60)